@@ -22,18 +22,41 @@ There is a locking facility that uses SQLite's transaction API::
 ...   db[42] = l
 ```
 
+A KV can be shared between threads. Its statements are serialized, and
+`lock()` keeps the other threads out until the transaction is committed.
+
+KV objects created in one thread with `share_connection=True` reuse one
+connection to the same database, saving the cost of opening it. They then also
+share its transactions: writes made through one of them while another holds
+`lock()` are committed or rolled back with that transaction.
+
+Connections are opened in WAL mode with a few other performance-minded
+PRAGMAs. Pass `pragmas={}` to keep SQLite's defaults, or a dict of your own.
+
+Pass `cache_size=N` to keep the N most recently read values in memory. The
+cache only sees writes made through the same KV object, so use it only when
+nothing else writes to the table. Reads inside a transaction always go to SQLite.
+
+Pass `serializer="pickle"` (or `"msgpack"`, if installed) to store values in
+another format than JSON. Pickle round-trips any picklable Python object, but
+unpickling can run arbitrary code, so only use it on databases you trust.
+
 Original version written by Alex Morega, 2012-2025 (until 0.4.1).
 Adapted to single-file-module by Marcin Konowalczyk, 2024 (0.5.0+).
 """
 
-import argparse
 import json
+import re
 import sqlite3
 import sys
-from collections.abc import MutableMapping
+import threading
+from collections import OrderedDict
+from collections.abc import ItemsView, Iterable, MutableMapping, Sequence, ValuesView
 from contextlib import contextmanager
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Iterator, Literal, Union
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Literal, NamedTuple, Union
+from weakref import WeakValueDictionary
 
 if TYPE_CHECKING:
     from typing_extensions import Self, override
@@ -45,82 +68,485 @@ __version__ = "0.5.1"
 
 __all__ = ["KV", "KVError"]
 
+# Use the fastest JSON implementation available. Values are stored as BLOBs of
+# UTF-8 encoded JSON, so SQLite copies them as-is instead of transcoding TEXT.
+# The loaders of all backends accept both bytes and the str of older databases.
+_Dumps = Callable[[Any], bytes]
+_Loads = Callable[[Union[str, bytes]], Any]
+_dumps: _Dumps
+_loads: _Loads
+
+try:
+    import orjson
+
+    # Keep orjson to what the stdlib accepts too: datetimes and dataclasses go to
+    # _unsupported, and non-str dict keys raise, which hands the dict to the
+    # stdlib. (Enum members are the exception. orjson stores them by value.)
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def _unsupported(value: Any) -> Any:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    # orjson writes NaN and infinities as null and UUIDs as strings, where the
+    # stdlib writes NaN/Infinity and rejects UUIDs. Output with either of those
+    # is decoded again, and only redone by the stdlib if it isn't the value.
+    _MAYBE_LOSSY = re.compile(rb'null|"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"')
+
+    def _dumps(value: Any) -> bytes:
+        try:
+            data: bytes = orjson.dumps(value, default=_unsupported, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # e.g. integers wider than 64 bits or lone surrogates, which the
+            # stdlib handles fine (and types which it rejects just as well)
+            return json.dumps(value).encode()
+        if type(value) is not str and _MAYBE_LOSSY.search(data) and orjson.loads(data) != value:
+            return json.dumps(value).encode()
+        return data
+
+    # orjson silently turns integers outside of the 64 bit range into floats.
+    # Such integers have 19+ digits, so payloads with a run of digits that long
+    # (or str from older databases) are left to the stdlib, which is lossless.
+    _LONG_DIGITS = re.compile(rb"[0-9]{19}")
+
+    def _loads(data: Union[str, bytes]) -> Any:
+        if type(data) is not bytes or _LONG_DIGITS.search(data):
+            return json.loads(data)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaN, Infinity and escaped lone surrogates, as written by the stdlib
+            return json.loads(data)
+
+except ImportError:
+
+    def _dumps(value: Any) -> bytes:
+        # json.dumps runs the full encoder setup even for the simplest
+        # scalars (str it already special-cases), costing ~10x these checks
+        if value is None:
+            return b"null"
+        if value is True:
+            return b"true"
+        if value is False:
+            return b"false"
+        if type(value) is int:
+            return repr(value).encode()
+        return json.dumps(value).encode()
+
+    # ujson only decodes. Its encoder turns any dict key into a string with str(),
+    # so it would store values which the stdlib (and orjson above) rejects.
+    try:
+        import ujson
+
+        _loads = ujson.loads
+    except ImportError:
+        _loads = json.loads
+
+
+def _serializer(name: str) -> tuple[_Dumps, _Loads]:
+    # Alternatives to JSON are imported on first use. msgpack is an optional
+    # dependency, so a missing package raises ImportError here.
+    if name == "json":
+        return _dumps, _loads
+    if name == "pickle":
+        import pickle
+
+        # Only JSON databases can hold the str values of older versions
+        return partial(pickle.dumps, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads  # type: ignore[return-value]
+    if name == "msgpack":
+        import msgpack
+
+        # Like JSON, allow non-str keys in the stored dicts
+        return msgpack.packb, partial(msgpack.unpackb, strict_map_key=False)
+    raise ValueError(f"Invalid serializer: {name!r}")
+
+
+# Applied to every new connection unless overridden with the `pragmas` argument.
+# WAL lets readers proceed while a writer holds the lock. Under WAL, NORMAL sync
+# keeps the database consistent but may lose the last commits on power loss.
+_DEFAULT_PRAGMAS: dict[str, Union[str, int]] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64000,  # 64 MiB
+    "mmap_size": 268435456,  # 256 MiB
+}
+
 
 class KVError(Exception):
     pass
 
 
+class _Connection(sqlite3.Connection):
+    """SQLite connection which can be shared by several KV instances."""
+
+    pool_key: Union[tuple[Any, ...], None] = None
+    users: int = 0
+    # The KV whose lock() began the open transaction. Only it ends the
+    # transaction, which other KVs on the connection may have joined.
+    owner: Union["KV", None] = None
+    # Connections are opened with check_same_thread=False, so that a KV can be
+    # used from any thread. Statements and the fetching of their results are
+    # serialized on this lock, and lock() holds it for the whole transaction.
+    mutex: threading.RLock
+
+
+# Open connections by (db_uri, timeout, thread, pragmas). KV instances of one
+# thread opening the same database with share_connection=True share a connection,
+# and with it the cost of opening the file (and its transactions). Each thread
+# keeps its own connections, so transactions are still isolated between threads.
+_POOL: WeakValueDictionary[tuple[Any, ...], _Connection] = WeakValueDictionary()
+_POOL_LOCK = threading.Lock()
+
+
+def _connect(db_uri: str, timeout: float, pragmas: dict[str, Union[str, int]], shared: bool) -> _Connection:
+    pool_key = (db_uri, timeout, threading.get_ident(), tuple(pragmas.items()))
+    with _POOL_LOCK:
+        db = _POOL.get(pool_key) if shared else None
+        if db is None:
+            db = sqlite3.connect(
+                db_uri, timeout=timeout, cached_statements=256, check_same_thread=False, factory=_Connection
+            )
+            db.isolation_level = None
+            db.mutex = threading.RLock()
+            for name, value in pragmas.items():
+                db.execute(f"PRAGMA {name}={value}")
+            # Every connection to ':memory:' (or '') is a new, private database
+            if shared and db_uri not in ("", ":memory:"):
+                db.pool_key = pool_key
+                _POOL[pool_key] = db
+        db.users += 1
+    return db
+
+
+def _disconnect(db: _Connection) -> None:
+    with _POOL_LOCK:
+        db.users -= 1
+        if not db.users:
+            if db.pool_key is not None:
+                _POOL.pop(db.pool_key, None)
+            db.close()
+
+
+# Plain SQL identifiers only. The table name is interpolated into the statements.
+_TABLE_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class _Statements(NamedTuple):
+    create: str
+    size: str
+    get: str
+    has: str
+    keys: str
+    items: str
+    first: str
+    upsert: str
+    delete: str
+    clear: str
+
+
+@lru_cache(maxsize=64)
+def _statements(table: str) -> _Statements:
+    # Built once per table name, so KV instances on the same table hand SQLite
+    # the very same strings and nothing is formatted on the hot path. Quoting
+    # the name lets SQL keywords such as 'order' be used as table names. 'key IS ?'
+    # matches the None key too (where 'key = NULL' never does) and still uses the
+    # primary key index. Only the upsert can't handle the None key (see _set_null).
+    table = f'"{table}"'
+    return _Statements(
+        create=f"CREATE TABLE IF NOT EXISTS {table} (key PRIMARY KEY, value BLOB)",
+        size=f"SELECT COUNT(*) FROM {table}",
+        get=f"SELECT value FROM {table} WHERE key IS ?",
+        has=f"SELECT 1 FROM {table} WHERE key IS ? LIMIT 1",
+        keys=f"SELECT key FROM {table}",
+        items=f"SELECT key, value FROM {table}",
+        first=f"SELECT key, value FROM {table} LIMIT 1",
+        upsert=f"INSERT INTO {table} VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        delete=f"DELETE FROM {table} WHERE key IS ?",
+        clear=f"DELETE FROM {table}",
+    )
+
+
+_MISSING = object()
+
+
 class KV(MutableMapping):
+    # MutableMapping and its bases declare empty __slots__, so KV has no __dict__
+    __slots__ = (
+        "__weakref__",
+        "_cache",
+        "_cache_size",
+        "_cursor",
+        "_db",
+        "_db_uri",
+        "_dumps",
+        "_loads",
+        "_locks",
+        "_mutex",
+        "_sql",
+        "_table",
+    )
+
     def __init__(
         self,
         db_uri: Union[str, Path] = ":memory:",
         table: str = "data",
         timeout: float = 5.0,
+        pragmas: Union[dict[str, Union[str, int]], None] = None,
+        cache_size: int = 0,
+        serializer: Literal["json", "pickle", "msgpack"] = "json",
+        share_connection: bool = False,
     ) -> None:
+        if not _TABLE_NAME.fullmatch(table):
+            raise ValueError(f"Invalid table name: {table!r}")
+        self._dumps, self._loads = _serializer(serializer)
         self._db_uri = str(db_uri)
-        self._db: Union[sqlite3.Connection, None] = sqlite3.connect(self._db_uri, timeout=timeout)
-        self._db.isolation_level = None
+        self._db: Union[_Connection, None] = _connect(
+            self._db_uri, timeout, _DEFAULT_PRAGMAS if pragmas is None else pragmas, share_connection
+        )
+        self._cursor: Union[sqlite3.Cursor, None] = self._db.cursor()
+        self._mutex = self._db.mutex
         self._table = table
-        self._execute(f"CREATE TABLE IF NOT EXISTS {self._table} (key PRIMARY KEY, value)")
+
+        self._sql = _statements(table)
+        self._execute(self._sql.create)
         self._locks = 0
 
+        # Most recently read values, still encoded so every read returns a fresh object
+        self._cache: Union[OrderedDict[Any, Union[str, bytes]], None] = OrderedDict() if cache_size > 0 else None
+        self._cache_size = cache_size
+
     @property
     def db_uri(self) -> str:
         return self._db_uri
 
-    def _execute(self, sql: str, *args: Any) -> sqlite3.Cursor:
-        if self._db is None:
+    # The cursor is shared, so each helper below fetches what it needs before
+    # releasing the mutex for the next thread.
+
+    def _execute(self, sql: str, args: Sequence[Any] = ()) -> int:
+        if self._cursor is None:
+            raise KVError("Execute on closed database")
+        with self._mutex:
+            return self._cursor.execute(sql, args).rowcount
+
+    def _executemany(self, sql: str, args: Iterable[Any]) -> None:
+        if self._cursor is None:
+            raise KVError("Execute on closed database")
+        with self._mutex:
+            self._cursor.executemany(sql, args)
+
+    def _fetchone(self, sql: str, args: Sequence[Any] = ()) -> Any:
+        if self._cursor is None:
             raise KVError("Execute on closed database")
-        return self._db.cursor().execute(sql, *args)
+        with self._mutex:
+            return self._cursor.execute(sql, args).fetchone()
+
+    def _fetchall(self, sql: str, args: Sequence[Any] = ()) -> list[Any]:
+        if self._cursor is None:
+            raise KVError("Execute on closed database")
+        with self._mutex:
+            return self._cursor.execute(sql, args).fetchall()
+
+    def _cached_value(self, key: Any, cache: OrderedDict[Any, Union[str, bytes]]) -> Union[str, bytes, None]:
+        """Encoded value of `key`, or None if there is no such key."""
+        with self._mutex:
+            # Inside a transaction, be it of this KV's lock() or one it joined on a
+            # shared connection, reads must see the stored value. They aren't cached
+            # either, since the transaction may yet be rolled back.
+            in_transaction = self._db is not None and self._db.in_transaction
+            if not in_transaction and key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+            row = self._fetchone(self._sql.get, (key,))
+            if row is None:
+                return None
+            if not in_transaction:
+                cache[key] = row[0]
+                if len(cache) > self._cache_size:
+                    cache.popitem(last=False)
+            return row[0]  # type: ignore[no-any-return]
+
+    # The dunders and get() below inline the helpers above, saving a Python
+    # call on every operation.
 
     @override
     def __len__(self) -> int:
-        [[n]] = self._execute(f"SELECT COUNT(*) FROM {self._table}")
+        cursor = self._cursor
+        if cursor is None:
+            raise KVError("Execute on closed database")
+        with self._mutex:
+            [n] = cursor.execute(self._sql.size).fetchone()
         return n  # type: ignore[no-any-return]
 
     @override
     def __getitem__(self, key: Union[str, None]) -> Any:
-        q: tuple[str, tuple[Any, ...]]
-        if key is None:
-            q = (f"SELECT value FROM {self._table} WHERE key is NULL", ())
-        else:
-            q = (f"SELECT value FROM {self._table} WHERE key=?", (key,))
-        for row in self._execute(*q):
-            return json.loads(row[0])
-        else:
-            raise KeyError
+        cache = self._cache
+        if cache is None:
+            cursor = self._cursor
+            if cursor is None:
+                raise KVError("Execute on closed database")
+            with self._mutex:
+                row = cursor.execute(self._sql.get, (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            return self._loads(row[0])
+        value = self._cached_value(key, cache)
+        if value is None:
+            raise KeyError(key)
+        return self._loads(value)
+
+    @override
+    def get(self, key: Any, default: Any = None) -> Any:
+        # Same query as __getitem__, minus raising and catching KeyError on a miss
+        cache = self._cache
+        if cache is None:
+            cursor = self._cursor
+            if cursor is None:
+                raise KVError("Execute on closed database")
+            with self._mutex:
+                row = cursor.execute(self._sql.get, (key,)).fetchone()
+            return default if row is None else self._loads(row[0])
+        value = self._cached_value(key, cache)
+        return default if value is None else self._loads(value)
+
+    @override
+    def __contains__(self, key: object) -> bool:
+        # Existence probe which doesn't decode the value only to throw it away
+        cursor = self._cursor
+        if cursor is None:
+            raise KVError("Execute on closed database")
+        with self._mutex:
+            return cursor.execute(self._sql.has, (key,)).fetchone() is not None
 
     @override
     def __iter__(self) -> Iterator[str]:
-        return (key for [key] in self._execute(f"SELECT key FROM {self._table}"))
+        # Keys are fetched up front, so the table can be modified while iterating
+        return (key for [key] in self._fetchall(self._sql.keys))
+
+    def _items(self) -> list[tuple[Any, Any]]:
+        return [(key, self._loads(value)) for key, value in self._fetchall(self._sql.items)]
+
+    @override
+    def items(self) -> ItemsView[Any, Any]:
+        return _ItemsView(self)
+
+    @override
+    def values(self) -> ValuesView[Any]:
+        return _ValuesView(self)
 
     @override
     def __setitem__(self, key: Union[str, None], value: Any) -> None:
-        jvalue = json.dumps(value)
+        # Encode outside of the mutex, so threads sharing the connection only
+        # wait for each other in SQLite. A single statement is atomic on its
+        # own, so it needs no lock() (which it joins if one is held anyway).
+        encoded = self._dumps(value)
+        if key is None:
+            self._set_null(encoded)
+        else:
+            cursor = self._cursor
+            if cursor is None:
+                raise KVError("Execute on closed database")
+            with self._mutex:
+                cursor.execute(self._sql.upsert, (key, encoded))
+        if self._cache is not None:
+            self._cache.pop(key, None)
+
+    def _set_null(self, encoded: bytes) -> None:
+        # The primary key admits any number of NULLs, so the upsert never
+        # conflicts on the None key. Its rows are replaced in one transaction
+        # instead, which also merges the duplicates older versions wrote.
         with self.lock():
-            try:
-                self._execute(f"INSERT INTO {self._table} VALUES (?, ?)", (key, jvalue))
-            except sqlite3.IntegrityError:
-                self._execute(f"UPDATE {self._table} SET value=? WHERE key=?", (jvalue, key))
+            self._execute(self._sql.delete, (None,))
+            self._execute(self._sql.upsert, (None, encoded))
 
     @override
-    def __delitem__(self, key: Union[str, None]) -> None:
-        if key in self:
-            self._execute(f"DELETE FROM {self._table} WHERE key=?", (key,))
+    def update(self, other: Any = (), /, **kwargs: Any) -> None:
+        # Same argument handling as MutableMapping.update, but all the rows go
+        # through one prepared statement in a single transaction.
+        if hasattr(other, "keys"):
+            items = [(key, self._dumps(other[key])) for key in other.keys()]  # noqa: SIM118
         else:
-            raise KeyError
+            items = [(key, self._dumps(value)) for key, value in other]
+        items += [(key, self._dumps(value)) for key, value in kwargs.items()]
+        null = [encoded for key, encoded in items if key is None]
+        with self.lock():
+            if null:
+                self._set_null(null[-1])
+                self._executemany(self._sql.upsert, [item for item in items if item[0] is not None])
+            else:
+                self._executemany(self._sql.upsert, items)
+        if self._cache is not None:
+            for key, _ in items:
+                self._cache.pop(key, None)
+
+    @override
+    def __delitem__(self, key: Union[str, None]) -> None:
+        cursor = self._cursor
+        if cursor is None:
+            raise KVError("Execute on closed database")
+        with self._mutex:
+            deleted = cursor.execute(self._sql.delete, (key,)).rowcount
+        if self._cache is not None:
+            self._cache.pop(key, None)
+        if not deleted:
+            raise KeyError(key)
+
+    # The MutableMapping versions of the methods below go through __getitem__,
+    # __setitem__ and __delitem__ one key at a time, raising KeyError on misses.
+
+    @override
+    def pop(self, key: Any, default: Any = _MISSING) -> Any:
+        with self.lock():
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                if default is _MISSING:
+                    raise KeyError(key)
+                return default
+            del self[key]
+        return value
+
+    @override
+    def popitem(self) -> tuple[Any, Any]:
+        with self.lock():
+            row = self._fetchone(self._sql.first)
+            if row is None:
+                raise KeyError
+            del self[row[0]]
+        return row[0], self._loads(row[1])
+
+    @override
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        with self.lock():
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                self[key] = value = default
+        return value
+
+    @override
+    def clear(self) -> None:
+        self._execute(self._sql.clear)
+        if self._cache is not None:
+            self._cache.clear()
 
     @contextmanager
     def lock(self) -> Iterator[None]:
-        if not self._locks:
-            self._execute("BEGIN IMMEDIATE TRANSACTION")
-        self._locks += 1
-        try:
-            yield
-        finally:
-            self._locks -= 1
-            if not self._locks:
-                self._execute("COMMIT")
+        # Other threads using the connection wait until the transaction is over
+        with self._mutex:
+            # Join the transaction if one is already open on the connection, be
+            # it from an outer lock() or from another KV sharing the connection
+            begin = False
+            if self._db is not None and not self._db.in_transaction:
+                self._execute("BEGIN IMMEDIATE TRANSACTION")
+                self._db.owner = self
+                begin = True
+            self._locks += 1
+            try:
+                yield
+            finally:
+                self._locks -= 1
+                # close() may have ended the transaction and the connection already
+                if begin and self._db is not None:
+                    self._db.owner = None
+                    self._execute("COMMIT")
 
     @property
     def locked(self) -> bool:
@@ -132,29 +558,32 @@ class KV(MutableMapping):
         - 'raise': raise an exception
         - 'abandon': abandon the transaction and close the database
         - 'flush': flush the transaction and close the database
+        A transaction which this KV joined through a shared connection is left
+        for the KV which began it to end.
         After this call, the object is unusable. Consider using `with` statement
         as opposed to calling `close()` explicitly: `with KV() as kv: ...`.
         """
         if self.locked:
             if if_locked == "raise":
                 raise KVError("Database is locked")
-            elif if_locked == "abandon":
-                self._execute("ROLLBACK")
-            elif if_locked == "flush":
-                self._execute("COMMIT")
-            else:
+            elif if_locked not in ("abandon", "flush"):
                 raise ValueError(f"Invalid if_locked: {if_locked}")
+            # A transaction this KV only joined is ended by the KV which began it
+            if self._db is not None and self._db.owner is self:
+                self._db.owner = None
+                self._execute("ROLLBACK" if if_locked == "abandon" else "COMMIT")
         self._locks = 0
 
         # Actually close the database connection
+        self._cursor = None
         if self._db is not None:
-            self._db.close()
+            _disconnect(self._db)
             self._db = None
 
-        # Make oneself unusable
+        # Make oneself unusable. Any further access raises KVError.
         self._table = ""
         self._db_uri = ""
-        self._execute = lambda *args: None  # type: ignore[assignment]
+        self._cache = None
 
     def __enter__(self) -> Self:
         return self
@@ -163,10 +592,60 @@ class KV(MutableMapping):
         self.close()
 
 
-def main(args: Union[list[str], None] = None) -> None:
+class _ItemsView(ItemsView):
+    """Items view fetching all rows in one query instead of one per key."""
+
+    __slots__ = ()
+    _mapping: KV
+
+    @override
+    def __iter__(self) -> Iterator[tuple[Any, Any]]:
+        return iter(self._mapping._items())
+
+
+class _ValuesView(ValuesView):
+    """Values view fetching all rows in one query instead of one per key."""
+
+    __slots__ = ()
+    _mapping: KV
+
+    @override
+    def __iter__(self) -> Iterator[Any]:
+        return (value for _, value in self._mapping._items())
+
+
+def _get(kv: KV, key: str) -> None:
+    value = kv.get(key, _MISSING)
+    if value is _MISSING:
+        sys.exit(1)
+    print(value)
+
+
+def _set(kv: KV, key: str, value: str) -> None:
+    kv[key] = value
+
+
+def _del(kv: KV, key: str) -> None:
+    try:
+        del kv[key]
+    except KeyError:
+        sys.exit(1)
+
+
+# Subcommand -> (handler, number of arguments it takes)
+_COMMANDS: dict[str, tuple[Callable[..., None], int]] = {
+    "get": (_get, 1),
+    "set": (_set, 2),
+    "del": (_del, 1),
+}
+
+
+def _parse_args(args: list[str]) -> tuple[str, str, list[str]]:
+    import argparse
+
     parser = argparse.ArgumentParser(description="Key-value store backed by SQLite.")
     parser.add_argument("db_uri", help="Database filename or URI")
-    parser.add_argument("-t", "--table", nargs=1, default="data", help="Table name")
+    parser.add_argument("-t", "--table", default="data", help="Table name")
     subparsers = parser.add_subparsers(dest="command")
 
     parser_get = subparsers.add_parser("get", help="Get the value for a key")
@@ -185,17 +664,35 @@ def main(args: Union[list[str], None] = None) -> None:
         parser.print_help()
         sys.exit(1)
 
-    with KV(opts.db_uri, opts.table) as kv:
-        if opts.command == "get":
-            if opts.key not in kv:
-                sys.exit(1)
-            print(kv[opts.key])
-        elif opts.command == "set":
-            kv[opts.key] = opts.value
-        elif opts.command == "del":
-            if opts.key not in kv:
-                sys.exit(1)
-            del kv[opts.key]
+    command = [opts.command, opts.key]
+    if opts.command == "set":
+        command.append(opts.value)
+    return opts.db_uri, opts.table, command
+
+
+def _main_with_kv(kv: KV, command: list[str]) -> None:
+    """Run a parsed 'COMMAND ARGS...' against an already open KV."""
+    handler, _ = _COMMANDS[command[0]]
+    handler(kv, *command[1:])
+
+
+def main(args: Union[list[str], None] = None) -> None:
+    args = sys.argv[1:] if args is None else list(args)
+
+    # 'DB COMMAND ARGS...' is dispatched directly. Options, help and malformed
+    # invocations go through argparse, which is only imported for them.
+    if (
+        len(args) >= 2
+        and args[1] in _COMMANDS
+        and len(args) == 2 + _COMMANDS[args[1]][1]
+        and not any(arg.startswith("-") for arg in args)
+    ):
+        db_uri, table, command = args[0], "data", args[1:]
+    else:
+        db_uri, table, command = _parse_args(args)
+
+    with KV(db_uri, table) as kv:
+        _main_with_kv(kv, command)
 
 
 __license__ = """
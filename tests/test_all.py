@@ -1,27 +1,57 @@
+import io
 import sqlite3
-from queue import Queue
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import date, datetime
+from pathlib import Path
 from threading import Thread
-from typing import Iterator
+from typing import Any, Iterator, Literal, Union
 from unittest import mock
+from uuid import UUID
 
 import pytest
-from conftest import __tests_dir__
 
 from kv import KV, KVError
+from kv.kv import _main_with_kv
 from kv.kv import main as kv_main
 
-KV_FILE = __tests_dir__ / "kv.sqlite"
+
+@pytest.fixture
+def kv_file(tmp_path: Path) -> Path:
+    # Run with --basetemp on a tmpfs (e.g. /dev/shm) to keep the databases in RAM
+    return tmp_path / "kv.sqlite"
 
 
 @pytest.fixture
-def kv() -> Iterator[KV]:
-    KV_FILE.unlink(missing_ok=True)
-    kv_instance = KV(KV_FILE)
+def fresh_kv(kv_file: Path) -> Iterator[KV]:
+    kv_instance = KV(kv_file)
     try:
         yield kv_instance
     finally:
         kv_instance.close()
-        KV_FILE.unlink(missing_ok=True)
+
+
+@pytest.fixture(scope="session")
+def _kv_shared(tmp_path_factory: pytest.TempPathFactory) -> Iterator[KV]:
+    kv_instance = KV(tmp_path_factory.mktemp("shared") / "kv.sqlite")
+    try:
+        yield kv_instance
+    finally:
+        kv_instance.close()
+
+
+@pytest.fixture
+def kv(_kv_shared: KV) -> Iterator[KV]:
+    # Isolate the tests sharing the database by rolling back whatever they wrote.
+    # KV runs in autocommit mode, so the savepoint opens the enclosing transaction
+    # and lock() joins it instead of committing. Tests of locking use fresh_kv.
+    db = _kv_shared._db
+    assert db is not None
+    db.execute("SAVEPOINT test")
+    try:
+        yield _kv_shared
+    finally:
+        db.execute("ROLLBACK TO test")
+        db.execute("RELEASE test")
 
 
 def test_new_kv_is_empty(kv: KV) -> None:
@@ -29,8 +59,7 @@ def test_new_kv_is_empty(kv: KV) -> None:
 
 
 def test_kv_with_two_items_has_size_two(kv: KV) -> None:
-    kv["a"] = "x"
-    kv["b"] = "x"
+    kv.update({"a": "x", "b": "x"})
     assert len(kv) == 2
 
 
@@ -48,6 +77,11 @@ def test_get_missing_value_with_default_returns_argument(kv: KV) -> None:
     assert kv.get("missing", fallback) is fallback
 
 
+def test_get_stored_null_value_ignores_default(kv: KV) -> None:
+    kv["a"] = None
+    assert kv.get("a", "fallback") is None
+
+
 def test_contains_missing_value_is_false(kv: KV) -> None:
     assert "missing" not in kv
 
@@ -78,6 +112,55 @@ def test_udpate_with_dictionary_items_retrieved_via_getitem(kv: KV) -> None:
     assert kv["a"] == "b"
 
 
+def test_update_overwrites_existing_items(kv: KV) -> None:
+    kv["a"] = "b"
+    kv.update({"a": "c", "d": "e"})
+    assert dict(kv) == {"a": "c", "d": "e"}
+
+
+def test_update_with_pairs_and_keyword_arguments(kv: KV) -> None:
+    kv.update([("a", "b"), ("c", "d")], e="f")
+    assert dict(kv) == {"a": "b", "c": "d", "e": "f"}
+
+
+def test_pop_removes_and_returns_item(kv: KV) -> None:
+    kv["a"] = "b"
+    assert kv.pop("a") == "b"
+    assert "a" not in kv
+    assert kv.pop("a", "fallback") == "fallback"
+    with pytest.raises(KeyError):
+        kv.pop("a")
+
+
+def test_popitem_removes_and_returns_item(kv: KV) -> None:
+    kv["a"] = "b"
+    assert kv.popitem() == ("a", "b")
+    with pytest.raises(KeyError):
+        kv.popitem()
+
+
+def test_setdefault_only_sets_missing_item(kv: KV) -> None:
+    assert kv.setdefault("a", "b") == "b"
+    assert kv.setdefault("a", "c") == "b"
+    assert kv["a"] == "b"
+
+
+def test_pop_and_setdefault_commit_their_writes(fresh_kv: KV, kv_file: Path) -> None:
+    # Under the kv fixture lock() never begins or commits a transaction of its own
+    fresh_kv.update({"a": "b", "c": "d"})
+    assert fresh_kv.pop("a") == "b"
+    assert fresh_kv.setdefault("e", "f") == "f"
+    assert not fresh_kv._db.in_transaction
+    with KV(kv_file) as kv2:
+        assert dict(kv2) == {"c": "d", "e": "f"}
+
+
+def test_clear_removes_all_items(kv: KV) -> None:
+    kv.update({"a": "x", "b": "y", None: "z"})
+    kv.clear()
+    assert len(kv) == 0
+
+
 def test_delete_missing_item_raises_key_error(kv: KV) -> None:
     with pytest.raises(KeyError):
         del kv["missing"]
@@ -91,81 +174,163 @@ def test_get_deleted_item_raises_key_error(kv: KV) -> None:
 
 
 def test_iter_yields_keys(kv: KV) -> None:
-    kv["a"] = "x"
-    kv["b"] = "x"
-    kv["c"] = "x"
+    kv.update({"a": "x", "b": "x", "c": "x"})
     assert set(kv) == {"a", "b", "c"}
 
 
-def test_value_saved_with_int_key_is_retrieved_with_int_key(kv: KV) -> None:
-    kv[13] = "a"
-    assert kv.get(13) == "a"
+def test_dict_of_kv_reads_values_while_iterating(kv: KV) -> None:
+    kv["a"] = "x"
+    kv["b"] = "y"
+    assert dict(kv) == {"a": "x", "b": "y"}
+
 
+def test_items_and_values_are_retrieved(kv: KV) -> None:
+    kv.update({"a": "x", "b": "y"})
+    assert sorted(kv.items()) == [("a", "x"), ("b", "y")]
+    assert sorted(kv.values()) == ["x", "y"]
+    assert ("a", "x") in kv.items()
+    assert len(kv.values()) == 2
 
-def test_value_saved_with_int_key_is_not_retrieved_with_str_key(kv: KV) -> None:
-    kv[13] = "a"
-    assert kv.get("13") is None
 
+@pytest.mark.parametrize("key", [13, 3.14, None, "\u2022", "13"])
+def test_value_saved_with_key_is_retrieved_with_same_key(kv: KV, key: object) -> None:
+    kv[key] = "a"
+    assert kv.get(key) == "a"
 
-def test_value_saved_with_str_key_is_not_retrieved_with_int_key(kv: KV) -> None:
-    kv["13"] = "a"
-    assert kv.get(13) is None
 
+@pytest.mark.parametrize("set_key, get_key", [(13, "13"), ("13", 13)])
+def test_value_saved_with_key_is_not_retrieved_with_key_of_other_type(kv: KV, set_key: object, get_key: object) -> None:
+    kv[set_key] = "a"
+    assert kv.get(get_key) is None
 
-def test_value_saved_at_null_key_is_retrieved(kv: KV) -> None:
+
+def test_value_saved_at_null_key_is_overwritten(kv: KV) -> None:
     kv[None] = "a"
-    assert kv.get(None) == "a"
+    kv[None] = "b"
+    assert kv[None] == "b"
+    kv.update({None: "c", "d": "e"})
+    assert kv[None] == "c"
+    assert kv.setdefault(None, "f") == "c"
+    assert len(kv) == 2
+    assert kv.pop(None) == "c"
+    assert len(kv) == 1
 
 
-def test_value_saved_with_float_key_is_retrieved_with_float_key(kv: KV) -> None:
-    kv[3.14] = "a"
-    assert kv.get(3.14) == "a"
+def test_value_saved_at_null_key_is_deleted(kv: KV) -> None:
+    kv[None] = "a"
+    assert None in kv
+    del kv[None]
+    assert None not in kv
 
 
-def test_value_saved_with_unicode_key_is_retrieved(kv: KV) -> None:
-    key = "\u2022"
-    kv[key] = "a"
-    assert kv.get(key) == "a"
+@pytest.mark.parametrize("value", [None, True, False, 0, -7, 2**70, 1.5, "", "b"])
+def test_scalar_value_is_retrieved(kv: KV, value: object) -> None:
+    kv["a"] = value
+    assert kv["a"] == value
+    assert type(kv["a"]) is type(value)
+
+
+def test_values_are_stored_as_json(kv: KV) -> None:
+    kv["a"] = {1: ("b", 2**70)}
+    assert kv["a"] == {"1": ["b", 2**70]}
+
+
+@pytest.mark.parametrize("value", [2**63 - 1, 2**64 - 1, 2**64 + 1, -(2**63) - 1, 10**30])
+def test_wide_integer_value_is_retrieved_exactly(kv: KV, value: int) -> None:
+    kv["a"] = [value]
+    assert kv["a"] == [value]
+    assert type(kv["a"][0]) is int
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf"), "\ud800", {"a": None}, str(UUID(int=1))])
+def test_value_outside_of_strict_json_is_retrieved(kv: KV, value: object) -> None:
+    kv["a"] = [value]
+    # repr, because nan != nan
+    assert repr(kv["a"]) == repr([value])
+
+
+@pytest.mark.parametrize("value", [datetime(2025, 1, 1), UUID(int=1), {date(2025, 1, 1): "a"}])
+def test_value_not_serializable_as_json_raises_type_error(kv: KV, value: object) -> None:
+    with pytest.raises(TypeError):
+        kv["a"] = value
+    assert "a" not in kv
+
+
+def test_values_are_stored_as_blobs(fresh_kv: KV) -> None:
+    fresh_kv["a"] = "b"
+    db = sqlite3.connect(fresh_kv.db_uri)
+    try:
+        assert db.execute("SELECT typeof(value) FROM data").fetchall() == [("blob",)]
+    finally:
+        db.close()
+
+
+def test_values_stored_as_text_are_retrieved(fresh_kv: KV) -> None:
+    db = sqlite3.connect(fresh_kv.db_uri)
+    try:
+        db.execute("INSERT INTO data VALUES ('a', '[\"b\"]')")
+        db.commit()
+    finally:
+        db.close()
+    assert fresh_kv["a"] == ["b"]
+
+
+def test_non_finite_floats_written_by_stdlib_json_are_retrieved(fresh_kv: KV) -> None:
+    db = sqlite3.connect(fresh_kv.db_uri)
+    try:
+        db.execute("INSERT INTO data VALUES (?, ?)", ("a", b"[NaN, Infinity, -Infinity]"))
+        db.commit()
+    finally:
+        db.close()
+    assert repr(fresh_kv["a"]) == "[nan, inf, -inf]"
 
 
 ################################################################################
 
 
-def test_value_saved_by_one_kv_client_is_read_by_another() -> None:
-    with KV(KV_FILE) as kv1:
+def test_value_saved_by_one_kv_client_is_read_by_another(kv_file: Path) -> None:
+    with KV(kv_file) as kv1:
         kv1["a"] = "b"
-        with KV(KV_FILE) as kv2:
+        with KV(kv_file) as kv2:
             assert kv2["a"] == "b"
 
 
-def test_deep_structure_is_retrieved_the_same() -> None:
-    from copy import deepcopy
-
+@pytest.mark.parametrize("serializer", ["json", "pickle", "msgpack"])
+def test_deep_structure_is_retrieved_the_same(kv_file: Path, serializer: Literal["json", "pickle", "msgpack"]) -> None:
+    if serializer == "msgpack":
+        pytest.importorskip("msgpack")
     value = {"a": ["b", {"c": 123}]}
-    with KV(KV_FILE) as kv1:
-        kv1["a"] = deepcopy(value)
-        with KV(KV_FILE) as kv2:
+    with KV(kv_file, serializer=serializer) as kv1:
+        kv1["a"] = value
+        with KV(kv_file, serializer=serializer) as kv2:
             assert kv2["a"] == value
 
 
-def test_lock_fails_if_db_already_locked() -> None:
-    db_path = KV_FILE
-    q1: Queue[None] = Queue()
-    q2: Queue[None] = Queue()
-    kv2 = KV(db_path, timeout=0.1)
+def test_pickle_serializer_keeps_python_types(kv_file: Path) -> None:
+    with KV(kv_file, serializer="pickle") as kv1:
+        kv1["a"] = {1: ("b", {2.5})}
+        assert kv1["a"] == {1: ("b", {2.5})}
 
-    def locker() -> None:
-        with (
-            KV(db_path) as kv1,
-            kv1.lock(),
-        ):
-            q1.put(None)
-            q2.get()
 
-    th = Thread(target=locker)
-    th.start()
+def test_msgpack_serializer_keeps_int_keys_and_bytes(kv_file: Path) -> None:
+    pytest.importorskip("msgpack")
+    with KV(kv_file, serializer="msgpack") as kv1:
+        kv1["a"] = {1: [b"b"]}
+        assert kv1["a"] == {1: [b"b"]}
+
+
+def test_invalid_serializer_raises_value_error(kv_file: Path) -> None:
+    serializer: Any = "yaml"
+    with pytest.raises(ValueError, match="Invalid serializer"):
+        KV(kv_file, serializer=serializer)
+
+
+def test_lock_fails_if_db_already_locked(kv_file: Path) -> None:
+    kv2 = KV(kv_file, timeout=0)
+    # Hold the write lock from another connection, the same way KV.lock() takes it
+    db = sqlite3.connect(kv_file, isolation_level=None)
+    db.execute("BEGIN IMMEDIATE")
     try:
-        q1.get()
         with (
             pytest.raises(sqlite3.OperationalError, match="database is locked"),
             kv2.lock(),
@@ -174,22 +339,160 @@ def test_lock_fails_if_db_already_locked() -> None:
         with pytest.raises(sqlite3.OperationalError, match="database is locked"):
             kv2["a"] = "b"
     finally:
-        q2.put(None)
-        th.join()
+        db.execute("ROLLBACK")
+        db.close()
         kv2.close()
 
 
-def test_lock_during_lock_still_saves_value() -> None:
-    with KV(KV_FILE) as kv1:
+def test_kv_clients_do_not_share_transactions_by_default(kv_file: Path) -> None:
+    with KV(kv_file) as kv1, KV(kv_file, timeout=0) as kv2:
+        with kv1.lock():
+            kv1["a"] = "b"
+            assert "a" not in kv2
+            with pytest.raises(sqlite3.OperationalError, match="database is locked"):
+                kv2["x"] = 1
+            kv1.close(if_locked="abandon")
+        assert "a" not in kv2
+
+
+def test_kv_clients_in_one_thread_share_the_connection(kv_file: Path) -> None:
+    with KV(kv_file, share_connection=True) as kv1:
+        with KV(kv_file, table="other", share_connection=True) as kv2, kv1.lock():
+            # Would time out on the lock held by kv1 with separate connections
+            kv2["a"] = "b"
+        kv1["a"] = "c"
+        assert kv1["a"] == "c"
+
+
+def test_close_of_kv_which_joined_a_transaction_leaves_it_to_the_owner(kv_file: Path) -> None:
+    with (
+        KV(kv_file, share_connection=True) as kv1,
+        KV(kv_file, share_connection=True) as kv2,
+        kv2.lock(),
+    ):
+        kv2["a"] = "b"
+        with kv1.lock():
+            kv1.close(if_locked="abandon")
+        kv2["c"] = "d"
+    with KV(kv_file) as kv3:
+        assert dict(kv3) == {"a": "b", "c": "d"}
+
+
+def test_memory_databases_are_not_shared() -> None:
+    with KV() as kv1, KV() as kv2:
+        kv1["a"] = "b"
+        assert "a" not in kv2
+
+
+def test_sql_keyword_can_be_used_as_table_name(kv_file: Path) -> None:
+    with KV(kv_file, table="order") as kv1:
+        kv1["a"] = "b"
+        assert kv1["a"] == "b"
+
+
+@pytest.mark.parametrize("table", ["", "1data", "data; DROP TABLE data", 'da"ta'])
+def test_invalid_table_name_raises_value_error(kv_file: Path, table: str) -> None:
+    with pytest.raises(ValueError, match="Invalid table name"):
+        KV(kv_file, table=table)
+
+
+def test_wal_journal_is_enabled_by_default(kv_file: Path) -> None:
+    with KV(kv_file):
+        db = sqlite3.connect(kv_file)
+        try:
+            assert db.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        finally:
+            db.close()
+
+
+def test_pragmas_can_be_overridden(kv_file: Path) -> None:
+    with KV(kv_file, pragmas={"journal_mode": "DELETE"}):
+        db = sqlite3.connect(kv_file)
+        try:
+            assert db.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+        finally:
+            db.close()
+
+
+def test_kv_can_be_used_from_another_thread(kv: KV) -> None:
+    kv["a"] = "b"
+    values: list[str] = []
+    th = Thread(target=lambda: values.append(kv["a"]))
+    th.start()
+    th.join()
+    assert values == ["b"]
+
+
+def test_lock_serializes_threads_sharing_a_kv(fresh_kv: KV, kv_file: Path) -> None:
+    # fresh_kv, so that each lock() runs and commits a transaction of its own
+    fresh_kv["n"] = 0
+
+    def increment() -> None:
+        for _ in range(50):
+            with fresh_kv.lock():
+                fresh_kv["n"] += 1
+
+    threads = [Thread(target=increment) for _ in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    with KV(kv_file) as kv2:
+        assert kv2["n"] == 200
+
+
+def test_read_cache_sees_writes_through_the_kv(kv_file: Path) -> None:
+    with KV(kv_file, cache_size=2) as kv1:
+        kv1["a"] = ["b"]
+        kv1["a"].append("c")
+        assert kv1["a"] == ["b"]
+        kv1["a"] = "d"
+        assert kv1["a"] == "d"
+        kv1.update(a="e")
+        assert kv1["a"] == "e"
+        del kv1["a"]
+        assert kv1.get("a") is None
+
+
+def test_read_cache_is_bypassed_in_lock(kv_file: Path) -> None:
+    with KV(kv_file, cache_size=2) as kv1:
+        kv1["a"] = "b"
+        assert kv1["a"] == "b"
+        db = sqlite3.connect(kv_file)
+        try:
+            db.execute("UPDATE data SET value='\"c\"' WHERE key='a'")
+            db.commit()
+        finally:
+            db.close()
+        assert kv1["a"] == "b"
+        with kv1.lock():
+            assert kv1["a"] == "c"
+
+
+def test_read_cache_does_not_keep_values_of_abandoned_transaction(kv_file: Path) -> None:
+    with (
+        KV(kv_file, share_connection=True) as kv1,
+        KV(kv_file, cache_size=2, share_connection=True) as kv2,
+    ):
+        kv1["a"] = "old"
+        with kv1.lock():
+            kv1["a"] = "new"
+            assert kv2["a"] == "new"
+            kv1.close(if_locked="abandon")
+        assert kv2["a"] == "old"
+
+
+def test_lock_during_lock_still_saves_value(kv_file: Path) -> None:
+    with KV(kv_file) as kv1:
         with kv1.lock(), kv1.lock():
             kv1["a"] = "b"
         assert kv1.get("a") == "b"
 
 
-def test_same_database_can_contain_two_namespaces() -> None:
+def test_same_database_can_contain_two_namespaces(kv_file: Path) -> None:
     with (
-        KV(KV_FILE) as kv1,
-        KV(KV_FILE, table="other") as kv2,
+        KV(kv_file) as kv1,
+        KV(kv_file, table="other") as kv2,
     ):
         kv1["a"] = "b"
         kv2["a"] = "c"
@@ -200,76 +503,111 @@ def test_same_database_can_contain_two_namespaces() -> None:
 ################################################################################
 
 
-def _run(db: str, /, *args: str) -> tuple[int, str]:
-    with (
-        mock.patch("kv.kv.print") as mprint,
-        mock.patch("sys.stderr") as mstderr,
-    ):
-        mstderr.write = mprint
-        retcode: int = 0
-        output = ""
+def _run(db: Union[KV, str], /, *args: str) -> tuple[int, str]:
+    stdout, stderr = io.StringIO(), io.StringIO()
+    retcode: int = 0
+    with redirect_stdout(stdout), redirect_stderr(stderr):
         try:
-            kv_main(args=(db, *args))
+            if isinstance(db, KV):
+                # Skip opening the database again and run the command on the open instance
+                _main_with_kv(db, list(args))
+            else:
+                kv_main(args=(db, *args))
         except SystemExit as e:
             retcode = e.code if isinstance(e.code, int) else -1
-        if mprint.called:
-            output = mprint.call_args[0][0]
-        return retcode, output
+    # strip() also drops the newline conftest prints before the first print()
+    return retcode, (stdout.getvalue() or stderr.getvalue()).strip()
 
 
 def test_cli_get(kv: KV) -> None:
     assert "foo" not in kv
-    assert _run(kv.db_uri, "get", "foo") == (1, "")
+    assert _run(kv, "get", "foo") == (1, "")
     kv["foo"] = "test"
     assert "foo" in kv
-    assert _run(kv.db_uri, "get", "foo") == (0, "test")
+    assert _run(kv, "get", "foo") == (0, "test")
 
 
 def test_cli_set(kv: KV) -> None:
     assert "foo" not in kv
-    assert _run(kv.db_uri, "set", "foo", "test") == (0, "")
+    assert _run(kv, "set", "foo", "test") == (0, "")
     assert "foo" in kv
     assert kv["foo"] == "test"
 
 
 def test_cli_del(kv: KV) -> None:
     assert "foo" not in kv
-    assert _run(kv.db_uri, "del", "foo") == (1, "")
+    assert _run(kv, "del", "foo") == (1, "")
     kv["foo"] = "test"
     assert "foo" in kv
-    assert _run(kv.db_uri, "del", "foo") == (0, "")
+    assert _run(kv, "del", "foo") == (0, "")
     assert "foo" not in kv
 
 
+def test_cli_plain_commands_skip_argparse(fresh_kv: KV, monkeypatch: pytest.MonkeyPatch) -> None:
+    db_uri = fresh_kv.db_uri
+    with monkeypatch.context() as m:
+        m.setattr("kv.kv._parse_args", mock.Mock(side_effect=AssertionError("argparse used")))
+        assert _run(db_uri, "set", "foo", "test") == (0, "")
+        assert _run(db_uri, "get", "foo") == (0, "test")
+        assert _run(db_uri, "del", "foo") == (0, "")
+        assert _run(db_uri, "get", "foo") == (1, "")
+    # Options and unexpected argument counts still go through argparse
+    assert _run(db_uri, "set", "foo", "-1") == (0, "")
+    assert fresh_kv["foo"] == "-1"
+    assert _run(db_uri, "get", "foo", "bar")[0] == 2
+
+
+def test_cli_missing_argument(kv: KV) -> None:
+    retcode, output = _run(kv.db_uri, "get")
+    assert retcode == 2
+    assert "required: key" in output
+
+
+def test_cli_table(fresh_kv: KV) -> None:
+    # main() writes through its own connection, outside of the kv fixture's savepoint
+    assert _run(fresh_kv.db_uri, "-t", "other", "set", "foo", "test") == (0, "")
+    assert "foo" not in fresh_kv
+    with KV(fresh_kv.db_uri, table="other") as other:
+        assert other["foo"] == "test"
+
+
 ################################################################################
 
 
-def test_close_if_locked_default(kv: KV) -> None:
-    kv["a"] = "b"
+def test_close_if_locked_default(fresh_kv: KV) -> None:
+    fresh_kv["a"] = "b"
 
     with (
         pytest.raises(KVError, match="[Dd]atabase is locked"),
-        kv.lock(),
+        fresh_kv.lock(),
     ):
-        kv.close()
+        fresh_kv.close()
 
 
-def test_close_if_locked_abandon(kv: KV) -> None:
-    assert "a" not in kv
-    with kv.lock():
-        kv["a"] = "b"
-        kv.close(if_locked="abandon")
+def test_closed_kv_raises(fresh_kv: KV) -> None:
+    fresh_kv.close()
+    with pytest.raises(KVError, match="closed database"):
+        fresh_kv["a"] = "b"
+    with pytest.raises(KVError, match="closed database"):
+        fresh_kv["a"]
+
 
-    with KV(KV_FILE) as kv:
+def test_close_if_locked_abandon(fresh_kv: KV, kv_file: Path) -> None:
+    assert "a" not in fresh_kv
+    with fresh_kv.lock():
+        fresh_kv["a"] = "b"
+        fresh_kv.close(if_locked="abandon")
+
+    with KV(kv_file) as kv:
         assert "a" not in kv
 
 
-def test_close_if_locked_flush(kv: KV) -> None:
-    assert "a" not in kv
-    with kv.lock():
-        kv["a"] = "b"
-        kv.close(if_locked="flush")
+def test_close_if_locked_flush(fresh_kv: KV, kv_file: Path) -> None:
+    assert "a" not in fresh_kv
+    with fresh_kv.lock():
+        fresh_kv["a"] = "b"
+        fresh_kv.close(if_locked="flush")
 
-    with KV(KV_FILE) as kv:
+    with KV(kv_file) as kv:
         assert "a" in kv
         assert kv["a"] == "b"